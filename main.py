@@ -1,11 +1,30 @@
 import asyncio
+import atexit
+import codecs
+import copy
+import hashlib
+import hmac
+import itertools
 import json
+import logging
+import os
+import queue
 import random
 import secrets
+import signal
+import socket
+import string
+import struct
+import subprocess
 import sys
 import threading
+import time
 import urllib.parse
+from array import array
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
 def _app_dir():
@@ -13,8 +32,9 @@ def _app_dir():
         return Path(sys.executable).resolve().parent
     return Path(__file__).resolve().parent
 
-from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal, QUrl
-from PyQt6.QtGui import QDesktopServices, QIcon, QPixmap, QFont
+from PyQt6.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal, QUrl
+from PyQt6.QtGui import QDesktopServices, QIcon, QKeySequence, QPixmap, QFont, QShortcut
+from PyQt6.QtNetwork import QLocalSocket, QTcpSocket
 from PyQt6.QtWidgets import (
     QApplication,
     QDialog,
@@ -29,13 +49,42 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 import aiohttp
+from aiohttp import web
 import websockets
 from twitchio.ext import commands
 
 CONFIG_PATH = _app_dir() / "config.json"
+LOG_DIR = _app_dir() / "logs"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 5
+TRACE_BUFFER_SIZE = 256
+TRACE_SLOW_MS = 1000
+IPC_INFO_PATH = _app_dir() / "babsbot-ipc.json"
+IPC_SOCKET_PATH = _app_dir() / "babsbot.sock"
+IPC_MAX_FRAME = 1 << 20
+BOT_PROCESS_MODES = ("thread", "child", "attach")
+BOT_CLIENT_RESPAWN_AFTER = 10
+BOT_CLIENT_MAX_SPAWNS = 3
 CHANNEL = "delboitv"
 OAUTH_PORT = 8765
 OAUTH_REDIRECT_URI = f"http://localhost:{OAUTH_PORT}/callback"
+EVENTSUB_TRANSPORTS = ("websocket", "webhook")
+EVENTSUB_WEBHOOK_HOST = "127.0.0.1"
+EVENTSUB_WEBHOOK_PORT = 8766
+EVENTSUB_WEBHOOK_PATH = "/eventsub"
+EVENTSUB_MAX_MESSAGE_AGE = 600
+RESPONSES_DIR = _app_dir() / "responses"
+RESPONSE_FIELDS = ("user", "viewers", "tier", "reward")
+RESPONSE_PACK_CHECK_INTERVAL = 2.0
+RESPONSE_PACK_CACHE_SIZE = 256
+HELIX_URL = "https://api.twitch.tv/helix"
+HELIX_PRIORITY_SUBSCRIBE = 0
+HELIX_PRIORITY_DEFAULT = 1
+HELIX_PRIORITY_CLEANUP = 2
+HELIX_MAX_CONCURRENCY = 4
+HELIX_MAX_RETRIES = 4
+HELIX_BACKOFF_BASE = 0.5
+HELIX_BACKOFF_MAX = 8.0
 OAUTH_SCOPES = "chat:read chat:edit moderator:read:followers channel:read:subscriptions channel:read:redemptions"
 TOKEN_GENERATOR_URL = (
     "https://twitchtokengenerator.com/"
@@ -43,6 +92,8 @@ TOKEN_GENERATOR_URL = (
     "+channel%3Aread%3Asubscriptions+channel%3Aread%3Aredemptions"
 )
 
+WELCOME_MESSAGE = "BabsBot here. I'll call out follows, raids, subs and redemptions."
+
 FOLLOWER_RESPONSES = [
     "Hey @{}, welcome. Don't expect fireworks—I'm still upright, barely.",
     "New blood! @{}. Hope you're on meds too—makes the chat bearable.",
@@ -79,6 +130,20 @@ REDEMPTION_RESPONSES = [
     "This stream sucks and so do you—kidding, sort of.",
 ]
 
+DEFAULT_RESPONSES = {
+    "follow": FOLLOWER_RESPONSES,
+    "raid": RAID_RESPONSES,
+    "sub": SUB_RESPONSES,
+    "redemption": REDEMPTION_RESPONSES,
+}
+
+EVENTSUB_RESPONSE_KINDS = {
+    "channel.follow": "follow",
+    "channel.raid": "raid",
+    "channel.subscribe": "sub",
+    "channel.channel_points_custom_reward_redemption.add": "redemption",
+}
+
 
 def load_config():
     if not CONFIG_PATH.exists():
@@ -99,6 +164,138 @@ def save_config(data):
         return False
 
 
+log = logging.getLogger("babsbot")
+_log_listener_ref = [None]
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line; pass structured fields with extra={"fields": {...}}."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        elif record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _LogQueueHandler(QueueHandler):
+    """Keeps the traceback as exc_text for JsonLogFormatter.
+
+    The stock prepare() formats the record on the caller's thread, folds the traceback
+    into msg and drops exc_info, which would leave nothing for the "exc" field.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.stack_info = None
+        return record
+
+
+def setup_logging(name="babsbot"):
+    """Send the babsbot logger through a queue; a QueueListener thread does the file writes.
+
+    Callers on the asyncio loop (or the Qt thread) only pay for a queue put. Each process
+    gets its own rotating file in logs/ because rotation can't be shared across processes.
+    """
+    if _log_listener_ref[0] is not None:
+        return
+    try:
+        LOG_DIR.mkdir(exist_ok=True)
+        handler = RotatingFileHandler(
+            LOG_DIR / (name + ".log"),
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8",
+            delay=True,
+        )
+    except OSError:
+        return
+    handler.setFormatter(JsonLogFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler)
+    log.addHandler(_LogQueueHandler(log_queue))
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    listener.start()
+    _log_listener_ref[0] = listener
+    atexit.register(listener.stop)
+
+
+class EventTrace:
+    """Timestamps for one EventSub message on its way to chat (receive, verify, decode, dispatch, send)."""
+
+    __slots__ = ("source", "message_id", "kind", "outcome", "started", "_t0", "stages")
+
+    def __init__(self, source):
+        self.source = source
+        self.message_id = None
+        self.kind = None
+        self.outcome = None
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        self.stages.append((stage, round((time.perf_counter() - self._t0) * 1000, 3)))
+
+    def total_ms(self):
+        return self.stages[-1][1] if self.stages else 0.0
+
+    def as_dict(self):
+        return {
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="milliseconds"),
+            "source": self.source,
+            "message_id": self.message_id,
+            "kind": self.kind,
+            "outcome": self.outcome,
+            "stages_ms": self.stages,
+            "total_ms": self.total_ms(),
+        }
+
+
+_event_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+_event_traces_lock = threading.Lock()
+
+
+def record_event_trace(trace):
+    with _event_traces_lock:
+        _event_traces.append(trace)
+    fields = trace.as_dict()
+    if trace.total_ms() >= TRACE_SLOW_MS:
+        log.warning("slow eventsub event", extra={"fields": fields})
+    else:
+        log.info("eventsub event", extra={"fields": fields})
+
+
+def dump_event_traces():
+    """Write the last TRACE_BUFFER_SIZE event traces to logs/trace-<time>.json. Returns the path, or "" on failure."""
+    with _event_traces_lock:
+        traces = [t.as_dict() for t in _event_traces]
+    path = LOG_DIR / ("trace-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    try:
+        LOG_DIR.mkdir(exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(traces, f, indent=2)
+    except OSError:
+        log.exception("could not write trace dump", extra={"fields": {"path": str(path)}})
+        return ""
+    log.info("trace dump written", extra={"fields": {"path": str(path), "events": len(traces)}})
+    return str(path)
+
+
 _oauth_token_queue = []
 _oauth_server_ref = [None]
 
@@ -156,15 +353,526 @@ def _run_oauth_server():
     _oauth_server_ref[0] = None
 
 
-class BotRunner(QThread):
-    status = pyqtSignal(str)
-    error = pyqtSignal(str)
-    eventsub_warning = pyqtSignal(str)
-    eventsub_ready = pyqtSignal()
-    channel_ready = pyqtSignal(str)
+def eventsub_signature(secret, message_id, timestamp, body):
+    """Twitch EventSub webhook signature: HMAC-SHA256 over id + timestamp + raw body."""
+    mac = hmac.new(secret.encode("utf-8"), message_id.encode("utf-8") + timestamp.encode("utf-8") + body, hashlib.sha256)
+    return "sha256=" + mac.hexdigest()
 
-    def __init__(self, access_token, refresh_token, client_id, channel_override=None, parent=None):
-        super().__init__(parent)
+
+def _parse_eventsub_timestamp(value):
+    # Twitch sends RFC3339 with nanoseconds (e.g. 2024-01-01T12:00:00.123456789Z); fromisoformat only takes micro.
+    value = (value or "").strip().rstrip("Zz")
+    if "." in value:
+        head, frac = value.split(".", 1)
+        value = head + "." + (frac[:6]).ljust(6, "0")
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+class EventSubWebhookReceiver:
+    """Local aiohttp receiver for EventSub webhook deliveries.
+
+    Checks the HMAC signature and message age, answers the callback challenge, drops
+    redelivered message IDs, and passes notifications on (with their EventTrace) in the
+    same shape as websocket messages so _handle_eventsub_notification works unchanged. Twitch needs an HTTPS
+    callback on port 443, so put this behind a tunnel or reverse proxy in production.
+    """
+
+    def __init__(self, secret, on_notification, on_revocation=None, host=EVENTSUB_WEBHOOK_HOST, port=EVENTSUB_WEBHOOK_PORT, path=EVENTSUB_WEBHOOK_PATH):
+        self.secret = secret
+        self.on_notification = on_notification
+        self.on_revocation = on_revocation
+        self.host = host
+        self.port = port
+        self.path = path
+        self._runner = None
+        self._seen_ids = OrderedDict()
+        self._tasks = set()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _is_duplicate(self, message_id):
+        if message_id in self._seen_ids:
+            return True
+        self._seen_ids[message_id] = True
+        while len(self._seen_ids) > 1000:
+            self._seen_ids.popitem(last=False)
+        return False
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, request):
+        trace = EventTrace("webhook")
+        body = await request.read()
+        trace.mark("receive")
+        message_id = request.headers.get("Twitch-Eventsub-Message-Id", "")
+        timestamp = request.headers.get("Twitch-Eventsub-Message-Timestamp", "")
+        signature = request.headers.get("Twitch-Eventsub-Message-Signature", "")
+        mtype = request.headers.get("Twitch-Eventsub-Message-Type", "")
+        if not (message_id and timestamp and signature):
+            return web.Response(status=403)
+        if not hmac.compare_digest(eventsub_signature(self.secret, message_id, timestamp, body), signature):
+            log.warning("eventsub webhook signature mismatch", extra={"fields": {"message_id": message_id}})
+            return web.Response(status=403)
+        sent_at = _parse_eventsub_timestamp(timestamp)
+        if sent_at is None or abs((datetime.now(timezone.utc) - sent_at).total_seconds()) > EVENTSUB_MAX_MESSAGE_AGE:
+            log.warning("eventsub webhook message too old", extra={"fields": {"message_id": message_id, "timestamp": timestamp}})
+            return web.Response(status=403)
+        trace.mark("verify")
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+        trace.mark("decode")
+        trace.message_id = message_id
+        if mtype == "webhook_callback_verification":
+            return web.Response(text=str(data.get("challenge", "")), content_type="text/plain")
+        if self._is_duplicate(message_id):
+            return web.Response(status=204)
+        ev = {
+            "metadata": {
+                "message_id": message_id,
+                "message_type": mtype,
+                "message_timestamp": timestamp,
+                "subscription_type": request.headers.get("Twitch-Eventsub-Subscription-Type", ""),
+            },
+            "payload": data,
+        }
+        if mtype == "notification":
+            self._spawn(self.on_notification(ev, trace))
+        elif mtype == "revocation" and self.on_revocation is not None:
+            self._spawn(self.on_revocation(ev))
+        return web.Response(status=204)
+
+
+class HelixResponse:
+    """Fully read Helix response; safe to hand to several coalesced callers."""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self):
+        return self.body.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.body) if self.body else {}
+
+
+class _HelixJob:
+    def __init__(self, method, path, params, body, priority, future):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.body = body
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+
+
+class HelixScheduler:
+    """Single queue for every Helix call made with one token.
+
+    Tracks the Ratelimit-Limit/Remaining/Reset bucket from response headers and holds
+    requests back once it is spent, dispatches by priority (lower number first), retries
+    429 and 5xx with backoff, and lets identical GETs already in flight share one response.
+    metrics() reports queue and bucket state.
+    """
+
+    def __init__(self, headers_fn, max_concurrency=HELIX_MAX_CONCURRENCY):
+        self._headers_fn = headers_fn
+        self._max_concurrency = max_concurrency
+        self._queue = None
+        self._slots = None
+        self._session = None
+        self._worker = None
+        self._seq = itertools.count()
+        self._queued = Counter()
+        self._inflight_gets = {}
+        self._pending = set()
+        self._in_flight = 0
+        self._limit = None
+        self._remaining = None
+        self._reset_at = 0.0
+        self._tasks = set()
+        self._stats = Counter(sent=0, retried=0, rate_limited=0, coalesced=0, failed=0)
+
+    def _ensure_started(self):
+        # Built on first use so the queue, semaphore and session belong to the loop that uses them.
+        if self._worker is None:
+            self._queue = asyncio.PriorityQueue()
+            self._slots = asyncio.Semaphore(self._max_concurrency)
+            self._session = aiohttp.ClientSession()
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(self._worker, *self._tasks, return_exceptions=True)
+        # Queued, in-flight and retry-waiting jobs alike: nobody may be left awaiting forever.
+        for future in list(self._pending):
+            if not future.done():
+                future.set_exception(ConnectionError("Helix scheduler closed"))
+        self._queued.clear()
+        self._in_flight = 0
+        await self._session.close()
+        self._worker = None
+
+    async def request(self, method, path, params=None, body=None, priority=HELIX_PRIORITY_DEFAULT):
+        self._ensure_started()
+        key = None
+        if method == "GET":
+            key = (path, tuple(sorted((params or {}).items())))
+            shared = self._inflight_gets.get(key)
+            if shared is not None:
+                self._stats["coalesced"] += 1
+                return await asyncio.shield(shared)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        if key is not None:
+            self._inflight_gets[key] = future
+            future.add_done_callback(lambda f: self._inflight_gets.pop(key, None))
+        self._put(_HelixJob(method, path, params, body, priority, future))
+        return await asyncio.shield(future)
+
+    def metrics(self):
+        return {
+            "queued": sum(self._queued.values()),
+            "queued_by_priority": dict(self._queued),
+            "in_flight": self._in_flight,
+            "bucket_limit": self._limit,
+            "bucket_remaining": self._remaining,
+            "bucket_reset_in": max(0.0, round(self._reset_at - time.time(), 1)) if self._reset_at else None,
+            **self._stats,
+        }
+
+    def _put(self, job):
+        self._queued[job.priority] += 1
+        self._queue.put_nowait((job.priority, next(self._seq), job))
+
+    def _has_budget(self):
+        if self._remaining is None or time.time() >= self._reset_at:
+            return True
+        return self._remaining - self._in_flight > 0
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            while not self._has_budget():
+                await asyncio.sleep(max(self._reset_at - time.time(), 0.05))
+            item = await self._queue.get()
+            if not self._has_budget():
+                # Bucket emptied while we waited for work; put it back so priority still holds after the reset.
+                self._queue.put_nowait(item)
+                self._slots.release()
+                continue
+            job = item[2]
+            self._queued[job.priority] -= 1
+            if not self._queued[job.priority]:
+                del self._queued[job.priority]
+            self._in_flight += 1
+            self._spawn(self._send(job))
+
+    def _update_bucket(self, headers):
+        try:
+            self._limit = int(headers["Ratelimit-Limit"])
+            self._remaining = int(headers["Ratelimit-Remaining"])
+            self._reset_at = float(headers["Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            pass
+
+    async def _send(self, job):
+        resp = None
+        err = None
+        fatal = None
+        try:
+            async with self._session.request(
+                job.method,
+                HELIX_URL + job.path,
+                headers=self._headers_fn(),
+                params=job.params,
+                json=job.body,
+            ) as r:
+                payload = await r.read()
+                self._update_bucket(r.headers)
+                resp = HelixResponse(r.status, dict(r.headers), payload)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            err = e
+        except Exception as e:
+            # Not a network problem (e.g. a None header value); retrying can't help.
+            fatal = e
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+        if fatal is not None:
+            self._stats["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(fatal)
+            return
+        if resp is not None:
+            self._stats["sent"] += 1
+        if job.future.done():
+            return
+        if resp is not None and resp.status != 429 and resp.status < 500:
+            job.future.set_result(resp)
+            return
+        if job.attempts >= HELIX_MAX_RETRIES:
+            self._stats["failed"] += 1
+            if resp is not None:
+                job.future.set_result(resp)
+            else:
+                job.future.set_exception(err)
+            return
+        backoff = min(HELIX_BACKOFF_BASE * 2 ** job.attempts, HELIX_BACKOFF_MAX) * (0.5 + random.random() / 2)
+        if resp is not None and resp.status == 429:
+            self._stats["rate_limited"] += 1
+            self._remaining = 0
+            backoff = max(self._reset_at - time.time(), backoff)
+        job.attempts += 1
+        self._stats["retried"] += 1
+        await asyncio.sleep(backoff)
+        self._put(job)
+
+
+_template_formatter = string.Formatter()
+
+
+def compile_response_template(text):
+    """Split a response line into (is_field, value) parts once, so rendering is a join.
+
+    A bare {} is the old positional form and means {user}. Returns None for lines with
+    unbalanced braces, format specs or fields outside RESPONSE_FIELDS.
+    """
+    parts = []
+    try:
+        for literal, field, spec, conversion in _template_formatter.parse(text):
+            if literal:
+                parts.append((False, literal))
+            if field is None:
+                continue
+            name = field or "user"
+            if name not in RESPONSE_FIELDS or spec or conversion:
+                return None
+            parts.append((True, name))
+    except ValueError:
+        return None
+    return tuple(parts)
+
+
+def render_response_template(parts, fields):
+    return "".join(fields.get(value, "") if is_field else value for is_field, value in parts)
+
+
+def _response_fields(event):
+    user = (event.get("user_name") or event.get("from_broadcaster_user_name") or event.get("user_login") or "").strip()
+    tier = str(event.get("tier") or "")
+    return {
+        "user": user or "someone",
+        "viewers": str(event.get("viewers", "")),
+        # Helix reports tiers as "1000"/"2000"/"3000".
+        "tier": str(int(tier) // 1000) if tier.isdigit() else tier,
+        "reward": ((event.get("reward") or {}).get("title") or "").strip(),
+    }
+
+
+class ShuffleBag:
+    """Hands out every index once, in random order, before any index repeats.
+
+    A new round never starts with the index that ended the previous one.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._bag = array("I")
+        self._last = None
+
+    def draw(self):
+        if not self._bag:
+            self._bag = array("I", range(self.size))
+            random.shuffle(self._bag)
+            if self.size > 1 and self._bag[-1] == self._last:
+                self._bag[0], self._bag[-1] = self._bag[-1], self._bag[0]
+        self._last = self._bag.pop()
+        return self._last
+
+
+class ResponsePack:
+    """Response lines for one event kind, from the first existing file in paths or the built-in list.
+
+    A file has one template per line; blank lines, lines starting with # and lines that
+    don't compile are skipped. It is indexed on first use by byte offset only, so a pack
+    with thousands of lines costs an array of offsets, not the text. A drawn line is read
+    and compiled again; the last RESPONSE_PACK_CACHE_SIZE of them stay cached. Every
+    RESPONSE_PACK_CHECK_INTERVAL seconds the paths are stat'ed again; a new, changed or
+    removed file rebuilds the index and bag.
+    """
+
+    def __init__(self, paths, fallback):
+        self.paths = list(paths)
+        self._fallback = list(fallback)
+        self._path = None
+        self._stamp = None
+        self._offsets = None
+        self._compiled = OrderedDict()
+        self._bag = None
+        self._checked_at = 0.0
+
+    def _current_stamp(self):
+        for path in self.paths:
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            return (path, st.st_mtime_ns, st.st_size)
+        return None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._bag is not None and now - self._checked_at < RESPONSE_PACK_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        stamp = self._current_stamp()
+        if self._bag is not None and stamp == self._stamp:
+            return
+        self._stamp = stamp
+        self._path = stamp[0] if stamp else None
+        self._offsets = None
+        if self._path is not None:
+            try:
+                self._offsets = self._index(self._path)
+            except OSError:
+                self._path = None
+        self._compiled = OrderedDict()
+        self._bag = ShuffleBag(len(self._offsets) if self._offsets is not None else len(self._fallback))
+
+    @staticmethod
+    def _index(path):
+        # Bad lines are left out here so the bag only holds lines that can be drawn.
+        offsets = array("q")
+        pos = 0
+        skipped = 0
+        with open(path, "rb") as f:
+            for raw in f:
+                line = raw.strip()
+                if pos == 0 and line.startswith(codecs.BOM_UTF8):
+                    line = line[len(codecs.BOM_UTF8):]
+                if line and not line.startswith(b"#"):
+                    if compile_response_template(line.decode("utf-8", "replace")) is None:
+                        skipped += 1
+                    else:
+                        offsets.append(pos)
+                pos += len(raw)
+        if skipped:
+            log.warning("response lines skipped", extra={"fields": {"path": str(path), "skipped": skipped}})
+        return offsets
+
+    def _line(self, i):
+        if self._offsets is None:
+            return self._fallback[i]
+        with open(self._path, "rb") as f:
+            f.seek(self._offsets[i])
+            return f.readline().decode("utf-8", "replace").strip().lstrip("\ufeff")
+
+    def draw(self):
+        """Compiled template for the next line, or None if the pack has no usable lines."""
+        self._refresh()
+        if not self._bag.size:
+            return None
+        i = self._bag.draw()
+        parts = self._compiled.get(i)
+        if parts is not None:
+            self._compiled.move_to_end(i)
+        else:
+            try:
+                parts = compile_response_template(self._line(i))
+            except OSError:
+                return None
+            if parts is None:
+                # The file changed since it was indexed; the next refresh rebuilds it.
+                return None
+            self._compiled[i] = parts
+            while len(self._compiled) > RESPONSE_PACK_CACHE_SIZE:
+                self._compiled.popitem(last=False)
+        return parts
+
+
+class ResponseLibrary:
+    """Per-channel response packs.
+
+    Each kind is read from responses/<channel>/<kind>.txt, else responses/<kind>.txt,
+    else the built-in list in DEFAULT_RESPONSES. Packs are only opened when that kind of
+    event first arrives.
+    """
+
+    def __init__(self, channel, root=RESPONSES_DIR):
+        self.channel = channel
+        self.root = root
+        self._packs = {}
+
+    def _pack(self, kind):
+        pack = self._packs.get(kind)
+        if pack is None:
+            paths = [self.root / self.channel / (kind + ".txt"), self.root / (kind + ".txt")]
+            pack = self._packs[kind] = ResponsePack(paths, DEFAULT_RESPONSES.get(kind, []))
+        return pack
+
+    def render(self, kind, fields):
+        parts = self._pack(kind).draw()
+        if parts is None:
+            return None
+        return render_response_template(parts, fields)
+
+
+class BotCore:
+    """Chat bot + EventSub, with no Qt in it.
+
+    Status goes out through emit(event, *args) using the BotRunner signal names, so the
+    same core can run in a QThread (BotRunner) or headless behind the IPC host (BotHost).
+    """
+
+    def __init__(
+        self,
+        access_token,
+        refresh_token,
+        client_id,
+        channel_override=None,
+        emit=None,
+        eventsub_transport=None,
+        client_secret=None,
+        webhook_callback_url=None,
+        webhook_secret=None,
+        webhook_host=None,
+        webhook_port=None,
+    ):
+        self._emit_cb = emit or (lambda event, *args: None)
         self.access_token = (access_token or "").strip().replace("oauth:", "")
         if self.access_token and not self.access_token.startswith("oauth:"):
             self.access_token = "oauth:" + self.access_token
@@ -172,75 +880,112 @@ class BotRunner(QThread):
         self.client_id = (client_id or "").strip() or None
         self._channel_override = (channel_override or "").strip().lower().replace("#", "") or None
         self._channel = None
+        self._responses = None
         self._bot = None
         self._loop = None
         self._eventsub_ws = None
+        self._eventsub_task = None
         self._eventsub_session_id = None
         self._broadcaster_id = None
+        transport = (eventsub_transport or "websocket").strip().lower()
+        self.eventsub_transport = transport if transport in EVENTSUB_TRANSPORTS else "websocket"
+        self.client_secret = (client_secret or "").strip() or None
+        self.webhook_callback_url = (webhook_callback_url or "").strip() or None
+        # Subscriptions are recreated on every start, so a per-run secret is fine when none is configured.
+        self.webhook_secret = (webhook_secret or "").strip() or secrets.token_hex(20)
+        self.webhook_host = (webhook_host or "").strip() or EVENTSUB_WEBHOOK_HOST
+        # webhook_port is hand-edited in config.json; fall back rather than fail to start.
+        self._webhook_port_warning = None
+        try:
+            self.webhook_port = int(webhook_port or EVENTSUB_WEBHOOK_PORT)
+            if not 0 < self.webhook_port < 65536:
+                raise ValueError(webhook_port)
+        except (TypeError, ValueError):
+            self.webhook_port = EVENTSUB_WEBHOOK_PORT
+            self._webhook_port_warning = f"EventSub webhook: webhook_port {webhook_port!r} in config.json is not a valid port; using {EVENTSUB_WEBHOOK_PORT}."
+        self._webhook_receiver = None
+        self._app_token = None
+        self._helix = HelixScheduler(lambda: self._helix_headers())
+        self._helix_app = HelixScheduler(lambda: self._helix_headers(app=True))
+
+    def _emit(self, event, *args):
+        level = logging.WARNING if event in ("error", "eventsub_warning") else logging.INFO
+        log.log(level, event, extra={"fields": {"args": list(args)}})
+        self._emit_cb(event, *args)
+
+    def helix_metrics(self):
+        return {"user": self._helix.metrics(), "app": self._helix_app.metrics()}
 
-    def _helix_headers(self, content_type=None):
+    def _helix_headers(self, content_type=None, app=False):
+        token = self._app_token if app else self.access_token.replace("oauth:", "")
         h = {
-            "Authorization": "Bearer " + self.access_token.replace("oauth:", ""),
+            "Authorization": "Bearer " + token,
             "Client-Id": self.client_id,
         }
         if content_type:
             h["Content-Type"] = content_type
         return h
 
-    def send_to_chat(self, text: str):
-        if self._loop is None or self._bot is None:
+    async def send_chat(self, text):
+        if self._bot is None:
             return
-        async def _send():
+        try:
+            await self._bot._connection.send(f"PRIVMSG #{self._channel} :{text}")
+        except Exception:
+            log.exception("raw PRIVMSG failed", extra={"fields": {"channel": self._channel}})
+        ch = self._bot.get_channel(self._channel) or next((c for c in self._bot.connected_channels if c is not None), None)
+        if ch:
+            try:
+                await ch.send(text)
+            except Exception:
+                log.exception("channel send failed", extra={"fields": {"channel": self._channel}})
+
+    async def stop(self):
+        if self._eventsub_task is not None:
+            self._eventsub_task.cancel()
+            self._eventsub_task = None
+        if self._webhook_receiver is not None:
+            await self._webhook_receiver.stop()
+            self._webhook_receiver = None
+        if self._bot is not None:
             try:
-                await self._bot._connection.send(f"PRIVMSG #{self._channel} :{text}")
+                await self._bot.close()
             except Exception:
                 pass
-            ch = self._bot.get_channel(self._channel) or next((c for c in self._bot.connected_channels if c is not None), None)
-            if ch:
-                try:
-                    await ch.send(text)
-                except Exception:
-                    pass
-        try:
-            asyncio.run_coroutine_threadsafe(_send(), self._loop)
-        except Exception:
-            pass
+        await self._helix.close()
+        await self._helix_app.close()
 
-    def run(self):
-        asyncio.run(self._run_bot_and_eventsub())
+    async def run(self):
+        await self._run_bot_and_eventsub()
 
     async def _get_token_user_login(self):
         """Get the Twitch login of the account that owns the token (their channel)."""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    "https://api.twitch.tv/helix/users",
-                    headers=self._helix_headers(),
-                ) as r:
-                    if r.status != 200:
-                        return None
-                    j = await r.json()
-                    users = j.get("data", [])
-                    if users:
-                        return (users[0].get("login") or "").strip().lower()
+            r = await self._helix.request("GET", "/users")
+            if r.status != 200:
+                return None
+            users = r.json().get("data", [])
+            if users:
+                return (users[0].get("login") or "").strip().lower()
         except Exception:
-            pass
+            log.exception("token user lookup failed")
         return None
 
     async def _run_bot_and_eventsub(self):
         self._loop = asyncio.get_event_loop()
         if not self.access_token:
-            self.error.emit("No access token in config.")
+            self._emit("error", "No access token in config.")
             return
         if self._channel_override:
             self._channel = self._channel_override
         else:
             token_login = await self._get_token_user_login()
             if not token_login:
-                self.error.emit("Could not get channel from token. Set 'Channel to join' in Settings or check token.")
+                self._emit("error", "Could not get channel from token. Set 'Channel to join' in Settings or check token.")
                 return
             self._channel = token_login
-        self.channel_ready.emit(self._channel)
+        self._responses = ResponseLibrary(self._channel)
+        self._emit("channel_ready", self._channel)
         try:
             self._bot = commands.Bot(
                 token=self.access_token,
@@ -251,31 +996,43 @@ class BotRunner(QThread):
 
             @self._bot.event()
             async def event_ready():
-                self.status.emit("connected")
+                self._emit("status", "connected")
                 await self._bot._connection.wait_until_ready()
-                msg = "BabsBot here. I'll call out follows, raids, subs and redemptions."
-                try:
-                    await self._bot._connection.send(f"PRIVMSG #{self._channel} :{msg}")
-                except Exception:
-                    pass
-                ch = self._bot.get_channel(self._channel) or next((c for c in self._bot.connected_channels if c is not None), None)
-                if ch:
-                    try:
-                        await ch.send(msg)
-                    except Exception:
-                        pass
-
-            asyncio.create_task(self._subscribe_eventsub())
+                await self.send_chat(WELCOME_MESSAGE)
+
+            self._eventsub_task = asyncio.create_task(self._subscribe_eventsub())
             await self._bot.start()
         except Exception as e:
-            self.error.emit(str(e))
+            self._emit("error", str(e))
 
     async def _subscribe_eventsub(self):
         if not self.access_token:
             return
+        if self.eventsub_transport == "webhook":
+            # The receiver starts before any credential checks so it can be tested offline.
+            await self._subscribe_eventsub_webhook()
+            return
         if not self.client_id:
-            self.eventsub_warning.emit("Client ID is required for follow/raid/sub/redemption. Add it in Settings (Show optional fields).")
+            self._emit("eventsub_warning", "Client ID is required for follow/raid/sub/redemption. Add it in Settings (Show optional fields).")
             return
+        await self._subscribe_eventsub_websocket()
+
+    def _eventsub_subscriptions(self):
+        return [
+            ("channel.follow", "2", {"broadcaster_user_id": self._broadcaster_id, "moderator_user_id": self._broadcaster_id}),
+            ("channel.raid", "1", {"to_broadcaster_user_id": self._broadcaster_id}),
+            ("channel.subscribe", "1", {"broadcaster_user_id": self._broadcaster_id}),
+            ("channel.channel_points_custom_reward_redemption.add", "1", {"broadcaster_user_id": self._broadcaster_id}),
+        ]
+
+    async def _create_eventsub_subscriptions(self, transport, app=False):
+        results = await asyncio.gather(
+            *(self._create_eventsub_sub(sub_type, version, condition, transport, app=app) for sub_type, version, condition in self._eventsub_subscriptions())
+        )
+        if all(results):
+            self._emit("eventsub_ready")
+
+    async def _subscribe_eventsub_websocket(self):
         try:
             async with websockets.connect(
                 "wss://eventsub.wss.twitch.tv/ws",
@@ -286,146 +1043,598 @@ class BotRunner(QThread):
                 msg = await asyncio.wait_for(ws.recv(), timeout=15)
                 data = json.loads(msg)
                 if data.get("metadata", {}).get("message_type") != "session_welcome":
-                    self.eventsub_warning.emit("EventSub: did not receive session_welcome.")
+                    self._emit("eventsub_warning", "EventSub: did not receive session_welcome.")
                     return
                 self._eventsub_session_id = data.get("payload", {}).get("session", {}).get("id")
                 if not self._eventsub_session_id:
-                    self.eventsub_warning.emit("EventSub: no session ID in welcome.")
+                    self._emit("eventsub_warning", "EventSub: no session ID in welcome.")
                     return
                 self._broadcaster_id = await self._get_broadcaster_id()
                 if not self._broadcaster_id:
                     return
-                await self._cleanup_eventsub_subscriptions()
-                subs = [
-                    ("channel.follow", "2", {"broadcaster_user_id": self._broadcaster_id, "moderator_user_id": self._broadcaster_id}),
-                    ("channel.raid", "1", {"to_broadcaster_user_id": self._broadcaster_id}),
-                    ("channel.subscribe", "1", {"broadcaster_user_id": self._broadcaster_id}),
-                    ("channel.channel_points_custom_reward_redemption.add", "1", {"broadcaster_user_id": self._broadcaster_id}),
-                ]
-                ok = True
-                for sub_type, version, condition in subs:
-                    ok = ok and await self._create_eventsub_sub(sub_type, version, condition)
-                if ok:
-                    self.eventsub_ready.emit()
+                # Cleanup skips this session's subscriptions, so both can share the Helix queue,
+                # where the creates (SUBSCRIBE priority) go out ahead of the list/deletes (CLEANUP).
+                await asyncio.gather(
+                    self._create_eventsub_subscriptions({"method": "websocket", "session_id": self._eventsub_session_id}),
+                    self._cleanup_eventsub_subscriptions(),
+                )
                 while True:
                     raw = await ws.recv()
+                    trace = EventTrace("websocket")
+                    trace.mark("receive")
                     ev = json.loads(raw)
+                    trace.mark("decode")
                     mtype = ev.get("metadata", {}).get("message_type")
                     if mtype == "notification":
-                        await self._handle_eventsub_notification(ev)
-                    elif mtype in ("session_reconnect", "revocation"):
+                        trace.message_id = ev.get("metadata", {}).get("message_id")
+                        await self._handle_eventsub_notification(ev, trace)
+                    elif mtype == "revocation":
+                        await self._on_eventsub_revocation(ev)
+                    elif mtype == "session_reconnect":
+                        log.warning("eventsub session_reconnect received; websocket listener stopping")
                         break
         except asyncio.CancelledError:
             pass
         except Exception:
-            pass
+            log.exception("eventsub websocket failed")
 
-    async def _get_broadcaster_id(self):
+    async def _subscribe_eventsub_webhook(self):
+        if self._webhook_port_warning:
+            self._emit("eventsub_warning", self._webhook_port_warning)
+        self._webhook_receiver = EventSubWebhookReceiver(
+            self.webhook_secret,
+            self._handle_eventsub_notification,
+            self._on_eventsub_revocation,
+            host=self.webhook_host,
+            port=self.webhook_port,
+        )
+        try:
+            # Twitch sends the challenge while the create call is in flight, so listen first.
+            await self._webhook_receiver.start()
+        except OSError as e:
+            self._emit("eventsub_warning", f"EventSub webhook: could not listen on {self.webhook_host}:{self.webhook_port} - {e!s}")
+            self._webhook_receiver = None
+            return
+        # Everything below talks to Twitch; the receiver keeps listening even if it fails.
+        if not self.client_id:
+            self._emit("eventsub_warning", "Client ID is required for follow/raid/sub/redemption. Add it in Settings (Show optional fields).")
+            return
+        if not self.webhook_callback_url:
+            self._emit("eventsub_warning", "EventSub webhook: set webhook_callback_url in config.json (public HTTPS URL that forwards to this PC).")
+            return
+        if not self.client_secret:
+            self._emit("eventsub_warning", "EventSub webhook: client_secret is required in config.json (webhooks need an app access token).")
+            return
+        self._app_token = await self._get_app_access_token()
+        if not self._app_token:
+            return
+        self._broadcaster_id = await self._get_broadcaster_id()
+        if not self._broadcaster_id:
+            return
+        # Old and new webhook subscriptions share a callback (a duplicate would be rejected), so clean up first.
+        await self._cleanup_eventsub_subscriptions()
+        await self._create_eventsub_subscriptions(
+            {"method": "webhook", "callback": self.webhook_callback_url, "secret": self.webhook_secret},
+            app=True,
+        )
+
+    async def _get_app_access_token(self):
         try:
             async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    "https://api.twitch.tv/helix/users?login=" + self._channel,
-                    headers=self._helix_headers(),
+                async with session.post(
+                    "https://id.twitch.tv/oauth2/token",
+                    params={
+                        "client_id": self.client_id,
+                        "client_secret": self.client_secret,
+                        "grant_type": "client_credentials",
+                    },
                 ) as r:
                     if r.status != 200:
-                        text = await r.text()
-                        try:
-                            j = json.loads(text)
-                            msg = j.get("message", text)
-                        except Exception:
-                            msg = text or str(r.status)
-                        self.eventsub_warning.emit(f"Could not get broadcaster ID: {r.status} - {msg}")
+                        self._emit("eventsub_warning", f"EventSub webhook: could not get app access token: HTTP {r.status}. Check client_secret.")
                         return None
                     j = await r.json()
-                    users = j.get("data", [])
-                    if users:
-                        return users[0].get("id")
+                    return j.get("access_token")
         except Exception as e:
-            self.eventsub_warning.emit(f"Could not get broadcaster ID: {e!s}")
+            self._emit("eventsub_warning", f"EventSub webhook: could not get app access token: {e!s}")
+        return None
+
+    async def _on_eventsub_revocation(self, ev):
+        sub = ev.get("payload", {}).get("subscription", {})
+        self._emit("eventsub_warning", f"EventSub: {sub.get('type', 'subscription')} was revoked by Twitch ({sub.get('status', 'unknown')}).")
+
+    async def _get_broadcaster_id(self):
+        try:
+            r = await self._helix.request("GET", "/users", params={"login": self._channel})
+            if r.status != 200:
+                text = r.text()
+                try:
+                    j = json.loads(text)
+                    msg = j.get("message", text)
+                except Exception:
+                    msg = text or str(r.status)
+                self._emit("eventsub_warning", f"Could not get broadcaster ID: {r.status} - {msg}")
+                return None
+            users = r.json().get("data", [])
+            if users:
+                return users[0].get("id")
+        except Exception as e:
+            self._emit("eventsub_warning", f"Could not get broadcaster ID: {e!s}")
         return None
 
     async def _cleanup_eventsub_subscriptions(self):
+        # Webhook subscriptions are only visible to the app token; only remove ones pointing at our callback.
+        app = self.eventsub_transport == "webhook"
+        helix = self._helix_app if app else self._helix
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    "https://api.twitch.tv/helix/eventsub/subscriptions",
-                    headers=self._helix_headers(),
-                ) as r:
-                    if r.status != 200:
-                        return
-                    j = await r.json()
-                    for sub in j.get("data", []):
-                        transport = sub.get("transport", {})
-                        if transport.get("method") == "websocket":
-                            sub_id = sub.get("id")
-                            if sub_id:
-                                async with session.delete(
-                                    "https://api.twitch.tv/helix/eventsub/subscriptions",
-                                    headers=self._helix_headers(),
-                                    params={"id": sub_id},
-                                ):
-                                    pass
+            r = await helix.request("GET", "/eventsub/subscriptions", priority=HELIX_PRIORITY_CLEANUP)
+            if r.status != 200:
+                log.warning("eventsub subscription list failed", extra={"fields": {"status": r.status, "app": app}})
+                return
+            stale_ids = []
+            for sub in r.json().get("data", []):
+                transport = sub.get("transport", {})
+                if app:
+                    stale = transport.get("method") == "webhook" and transport.get("callback") == self.webhook_callback_url
+                else:
+                    # Anything on another (dead) session; ours may already hold the new subscriptions.
+                    stale = transport.get("method") == "websocket" and transport.get("session_id") != self._eventsub_session_id
+                if stale and sub.get("id"):
+                    stale_ids.append(sub["id"])
+            results = await asyncio.gather(
+                *(helix.request("DELETE", "/eventsub/subscriptions", params={"id": sub_id}, priority=HELIX_PRIORITY_CLEANUP) for sub_id in stale_ids),
+                return_exceptions=True,
+            )
+            failed = [sub_id for sub_id, res in zip(stale_ids, results) if isinstance(res, BaseException) or res.status != 204]
+            log.info("eventsub cleanup", extra={"fields": {"stale": len(stale_ids), "failed": failed}})
         except Exception:
-            pass
+            log.exception("eventsub cleanup failed")
 
-    async def _create_eventsub_sub(self, sub_type, version, condition):
+    async def _create_eventsub_sub(self, sub_type, version, condition, transport, app=False):
+        helix = self._helix_app if app else self._helix
         try:
-            async with aiohttp.ClientSession() as session:
-                body = {
-                    "type": sub_type,
-                    "version": version,
-                    "condition": condition,
-                    "transport": {"method": "websocket", "session_id": self._eventsub_session_id},
-                }
-                async with session.post(
-                    "https://api.twitch.tv/helix/eventsub/subscriptions",
-                    headers=self._helix_headers("application/json"),
-                    json=body,
-                ) as r:
-                    if r.status not in (200, 202):
-                        try:
-                            j = await r.json()
-                            msg = j.get("message", str(r.status))
-                            if r.status == 403 and "channel.follow" in sub_type:
-                                msg = "Follow events need moderator:read:followers scope. Regenerate token with that scope (see Settings)."
-                            elif r.status == 403 and "channel.subscribe" in sub_type:
-                                msg = "Sub events need channel:read:subscriptions scope. Regenerate token (see Settings)."
-                            elif r.status == 403 and "redemption" in sub_type:
-                                msg = "Redemption events need channel:read:redemptions (or channel:manage:redemptions). Regenerate token (see Settings)."
-                            self.eventsub_warning.emit(f"{sub_type}: {msg}")
-                        except Exception:
-                            self.eventsub_warning.emit(f"{sub_type}: HTTP {r.status}")
-                        return False
-                    return True
+            body = {
+                "type": sub_type,
+                "version": version,
+                "condition": condition,
+                "transport": transport,
+            }
+            r = await helix.request("POST", "/eventsub/subscriptions", body=body, priority=HELIX_PRIORITY_SUBSCRIBE)
+            if r.status not in (200, 202):
+                try:
+                    msg = r.json().get("message", str(r.status))
+                    if r.status == 403 and "channel.follow" in sub_type:
+                        msg = "Follow events need moderator:read:followers scope. Regenerate token with that scope (see Settings)."
+                    elif r.status == 403 and "channel.subscribe" in sub_type:
+                        msg = "Sub events need channel:read:subscriptions scope. Regenerate token (see Settings)."
+                    elif r.status == 403 and "redemption" in sub_type:
+                        msg = "Redemption events need channel:read:redemptions (or channel:manage:redemptions). Regenerate token (see Settings)."
+                    self._emit("eventsub_warning", f"{sub_type}: {msg}")
+                except Exception:
+                    self._emit("eventsub_warning", f"{sub_type}: HTTP {r.status}")
+                return False
+            return True
         except Exception as e:
-            self.eventsub_warning.emit(f"{sub_type}: {e!s}")
+            self._emit("eventsub_warning", f"{sub_type}: {e!s}")
             return False
 
-    async def _handle_eventsub_notification(self, ev):
-        payload = ev.get("payload", {})
-        sub_type = payload.get("subscription", {}).get("type")
-        event = payload.get("event", {})
-        ch = self._bot.get_channel(self._channel)
-        if not ch:
+    async def _handle_eventsub_notification(self, ev, trace=None):
+        trace = trace or EventTrace("unknown")
+        try:
+            payload = ev.get("payload", {})
+            trace.kind = payload.get("subscription", {}).get("type")
+            kind = EVENTSUB_RESPONSE_KINDS.get(trace.kind)
+            ch = self._bot.get_channel(self._channel)
+            if not ch or kind is None or self._responses is None:
+                trace.outcome = "no channel" if not ch else "ignored"
+                return
+            msg = self._responses.render(kind, _response_fields(payload.get("event", {})))
+            trace.mark("dispatch")
+            if not msg:
+                trace.outcome = "no response"
+                return
+            await ch.send(msg)
+            trace.mark("send")
+            trace.outcome = "sent"
+        except Exception:
+            trace.outcome = "error"
+            log.exception("eventsub notification failed", extra={"fields": {"type": trace.kind, "message_id": trace.message_id}})
+        finally:
+            record_event_trace(trace)
+
+
+class BotRunner(QThread):
+    """Runs a BotCore on its own asyncio loop inside the GUI process."""
+
+    status = pyqtSignal(str)
+    error = pyqtSignal(str)
+    eventsub_warning = pyqtSignal(str)
+    eventsub_ready = pyqtSignal()
+    channel_ready = pyqtSignal(str)
+
+    def __init__(self, parent=None, **options):
+        super().__init__(parent)
+        self.core = BotCore(emit=self._emit_signal, **options)
+
+    def _emit_signal(self, event, *args):
+        getattr(self, event).emit(*args)
+
+    def send_to_chat(self, text: str):
+        if self.core._loop is None:
             return
-        user_name = (event.get("user_name") or event.get("from_broadcaster_user_name") or event.get("user_login") or "").strip()
         try:
-            if sub_type == "channel.follow":
-                msg = random.choice(FOLLOWER_RESPONSES)
-                if "{}" in msg:
-                    msg = msg.format(user_name or "someone")
-                await ch.send(msg)
-            elif sub_type == "channel.raid":
-                await ch.send(random.choice(RAID_RESPONSES))
-            elif sub_type == "channel.subscribe":
-                await ch.send(random.choice(SUB_RESPONSES))
-            elif sub_type == "channel.channel_points_custom_reward_redemption.add":
-                msg = random.choice(REDEMPTION_RESPONSES)
-                if "{}" in msg:
-                    msg = msg.format(user_name or "someone")
-                await ch.send(msg)
+            asyncio.run_coroutine_threadsafe(self.core.send_chat(text), self.core._loop)
         except Exception:
+            log.exception("could not schedule chat send")
+
+    def run(self):
+        asyncio.run(self.core.run())
+
+
+def _bot_options(cfg):
+    return {
+        "access_token": cfg.get("access_token"),
+        "refresh_token": cfg.get("refresh_token"),
+        "client_id": cfg.get("client_id"),
+        "channel_override": cfg.get("channel"),
+        "eventsub_transport": cfg.get("eventsub_transport"),
+        "client_secret": cfg.get("client_secret"),
+        "webhook_callback_url": cfg.get("webhook_callback_url"),
+        "webhook_secret": cfg.get("webhook_secret"),
+        "webhook_host": cfg.get("webhook_host"),
+        "webhook_port": cfg.get("webhook_port"),
+    }
+
+
+def _ipc_use_unix_socket():
+    # asyncio has no Unix server on Windows, and sun_path is capped at ~104 bytes elsewhere.
+    return sys.platform != "win32" and hasattr(socket, "AF_UNIX") and len(str(IPC_SOCKET_PATH)) < 100
+
+
+def ipc_encode(msg):
+    """One IPC frame: 4-byte big-endian length, then compact JSON."""
+    data = json.dumps(msg, separators=(",", ":")).encode("utf-8")
+    return struct.pack(">I", len(data)) + data
+
+
+def ipc_decode_frames(buf):
+    """Pop every complete frame off the front of buf (a bytearray); a partial frame stays in buf."""
+    msgs = []
+    while len(buf) >= 4:
+        (size,) = struct.unpack_from(">I", buf)
+        if size > IPC_MAX_FRAME:
+            raise ValueError("IPC frame too large")
+        if len(buf) < 4 + size:
+            break
+        msgs.append(json.loads(bytes(buf[4:4 + size])))
+        del buf[:4 + size]
+    return msgs
+
+
+async def _ipc_read(reader):
+    (size,) = struct.unpack(">I", await reader.readexactly(4))
+    if size > IPC_MAX_FRAME:
+        raise ValueError("IPC frame too large")
+    return json.loads(await reader.readexactly(size))
+
+
+def _read_ipc_info():
+    try:
+        with open(IPC_INFO_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _write_ipc_info(info):
+    # Created owner-only so the token is never readable by others, even briefly.
+    fd = os.open(IPC_INFO_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    if sys.platform != "win32":
+        os.fchmod(fd, 0o600)  # a file left from an older run keeps its old mode otherwise
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+
+
+def _remove_ipc_info():
+    # Only clean up what this process published; never another instance's socket or token.
+    info = _read_ipc_info()
+    if not info or info.get("pid") != os.getpid():
+        return
+    paths = [IPC_INFO_PATH]
+    if info.get("kind") == "unix":
+        paths.append(IPC_SOCKET_PATH)
+    for path in paths:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+async def _ipc_instance_alive():
+    """True if the bot in babsbot-ipc.json still accepts connections."""
+    info = _read_ipc_info()
+    if not info:
+        return False
+    try:
+        if info.get("kind") == "unix":
+            conn = asyncio.open_unix_connection(str(info.get("address", "")))
+        else:
+            conn = asyncio.open_connection(str(info.get("address", "127.0.0.1")), int(info.get("port", 0)))
+        _, writer = await asyncio.wait_for(conn, timeout=2)
+    except (OSError, asyncio.TimeoutError, ValueError, TypeError):
+        return False
+    writer.close()
+    return True
+
+
+def _spawn_headless_bot():
+    if getattr(sys, "frozen", False):
+        cmd = [sys.executable, "--headless"]
+    else:
+        cmd = [sys.executable, str(Path(__file__).resolve()), "--headless"]
+    kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "close_fds": True}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    subprocess.Popen(cmd, **kwargs)
+
+
+class BotHost:
+    """Headless bot process (main.py --headless) serving GUIs over local IPC.
+
+    Listens on a Unix socket (or 127.0.0.1 on Windows) and writes the address and a
+    random token to babsbot-ipc.json. A GUI sends {"op": "hello", "token": ...} first,
+    then gets the last known state replayed followed by live {"ev": ..., "args": [...]}
+    frames. Commands: send, reload_config, status, metrics, dump_trace, shutdown.
+    """
+
+    def __init__(self):
+        self._core = None
+        self._core_task = None
+        self._server = None
+        self._clients = set()
+        self._state = {}
+        self._token = secrets.token_urlsafe(24)
+        self._done = None
+
+    def _emit(self, event, *args):
+        if event != "eventsub_warning":
+            self._state[event] = list(args)
+        self._broadcast({"ev": event, "args": list(args)})
+
+    def _broadcast(self, msg):
+        frame = ipc_encode(msg)
+        for writer in list(self._clients):
+            try:
+                writer.write(frame)
+            except Exception:
+                self._clients.discard(writer)
+
+    def _replay_state(self, writer):
+        for event, args in self._state.items():
+            writer.write(ipc_encode({"ev": event, "args": args}))
+
+    async def _start_core(self):
+        self._state.clear()
+        self._core = BotCore(emit=self._emit, **_bot_options(load_config()))
+        self._core_task = asyncio.create_task(self._core.run())
+
+    async def _stop_core(self):
+        if self._core is not None:
+            await self._core.stop()
+            self._core = None
+        if self._core_task is not None:
+            self._core_task.cancel()
+            await asyncio.gather(self._core_task, return_exceptions=True)
+            self._core_task = None
+
+    async def _handle_client(self, reader, writer):
+        try:
+            hello = await asyncio.wait_for(_ipc_read(reader), timeout=5)
+            if not isinstance(hello, dict) or hello.get("op") != "hello" or not hmac.compare_digest(str(hello.get("token", "")), self._token):
+                return
+            self._clients.add(writer)
+            self._replay_state(writer)
+            while True:
+                await self._handle_command(await _ipc_read(reader), writer)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def _handle_command(self, msg, writer):
+        if not isinstance(msg, dict):
+            return
+        op = msg.get("op")
+        if op == "send":
+            if self._core is not None:
+                await self._core.send_chat(str(msg.get("text") or WELCOME_MESSAGE))
+        elif op == "reload_config":
+            await self._stop_core()
+            await self._start_core()
+        elif op == "status":
+            self._replay_state(writer)
+        elif op == "metrics":
+            helix = self._core.helix_metrics() if self._core is not None else {}
+            writer.write(ipc_encode({"ev": "metrics", "args": [helix]}))
+        elif op == "dump_trace":
+            writer.write(ipc_encode({"ev": "trace_dumped", "args": [dump_event_traces()]}))
+        elif op == "shutdown":
+            self._done.set()
+
+    async def serve(self):
+        """Run until shutdown. Returns False without starting if another headless bot is already up."""
+        if await _ipc_instance_alive():
+            log.warning("headless bot already running; not starting another", extra={"fields": {"pid": (_read_ipc_info() or {}).get("pid")}})
+            return False
+        self._done = asyncio.Event()
+        try:
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGTERM, self._done.set)
+            loop.add_signal_handler(signal.SIGUSR1, dump_event_traces)
+        except (NotImplementedError, AttributeError):
             pass
+        if _ipc_use_unix_socket():
+            try:
+                IPC_SOCKET_PATH.unlink()
+            except OSError:
+                pass
+            self._server = await asyncio.start_unix_server(self._handle_client, path=str(IPC_SOCKET_PATH))
+            os.chmod(IPC_SOCKET_PATH, 0o600)
+            info = {"kind": "unix", "address": str(IPC_SOCKET_PATH)}
+        else:
+            self._server = await asyncio.start_server(self._handle_client, "127.0.0.1", 0)
+            info = {"kind": "tcp", "address": "127.0.0.1", "port": self._server.sockets[0].getsockname()[1]}
+        info.update({"pid": os.getpid(), "token": self._token})
+        _write_ipc_info(info)
+        await self._start_core()
+        try:
+            await self._done.wait()
+        finally:
+            await self._stop_core()
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            # Let the client handlers see EOF and finish before the loop shuts down.
+            await asyncio.sleep(0.1)
+            _remove_ipc_info()
+        return True
+
+
+def run_headless():
+    setup_logging("babsbot-headless")
+    try:
+        if not asyncio.run(BotHost().serve()):
+            return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+class BotClient(QObject):
+    """GUI end of the IPC channel; stands in for BotRunner when the bot runs in its own process.
+
+    With spawn=True a headless bot is started if none answers, and started again if it
+    stays unreachable for BOT_CLIENT_RESPAWN_AFTER attempts (it crashed, or never came
+    up); after BOT_CLIENT_MAX_SPAWNS starts without a connection it reports an error.
+    Otherwise it only attaches. Reconnects on its own, so either side can restart
+    without taking the other down.
+    """
+
+    status = pyqtSignal(str)
+    error = pyqtSignal(str)
+    eventsub_warning = pyqtSignal(str)
+    eventsub_ready = pyqtSignal()
+    channel_ready = pyqtSignal(str)
+    detached = pyqtSignal()
+    trace_dumped = pyqtSignal(str)
+
+    def __init__(self, spawn=True, parent=None):
+        super().__init__(parent)
+        self._spawn = spawn
+        self._spawns = 0
+        self._misses = 0
+        self._gave_up = False
+        self._socket = None
+        self._connected = False
+        self._buf = bytearray()
+        self._token = ""
+        self._retry = QTimer(self)
+        self._retry.setInterval(1000)
+        self._retry.timeout.connect(self._try_connect)
+
+    def start(self):
+        self._try_connect()
+        self._retry.start()
+
+    def isRunning(self):
+        return self._connected
+
+    def send_to_chat(self, text: str):
+        self._send({"op": "send", "text": text})
+
+    def reload_config(self):
+        self._send({"op": "reload_config"})
+
+    def dump_traces(self):
+        self._send({"op": "dump_trace"})
+
+    def _send(self, msg):
+        if self._socket is not None and self._connected:
+            self._socket.write(ipc_encode(msg))
+
+    def _bot_missing(self):
+        # Called once per attempt (one a second) that found no bot to talk to.
+        if not self._spawn or self._gave_up:
+            return
+        if self._spawns and self._misses < BOT_CLIENT_RESPAWN_AFTER:
+            self._misses += 1
+            return
+        if self._spawns >= BOT_CLIENT_MAX_SPAWNS:
+            self._gave_up = True
+            self.error.emit("The bot process keeps stopping before the window can reach it. See logs/babsbot-headless.log.")
+            return
+        self._spawns += 1
+        self._misses = 0
+        _spawn_headless_bot()
+
+    def _try_connect(self):
+        if self._socket is not None:
+            return
+        info = _read_ipc_info()
+        if not info:
+            self._bot_missing()
+            return
+        self._token = str(info.get("token", ""))
+        if info.get("kind") == "unix":
+            sock = QLocalSocket(self)
+        else:
+            sock = QTcpSocket(self)
+        sock.connected.connect(self._on_connected)
+        sock.readyRead.connect(self._on_ready_read)
+        sock.disconnected.connect(self._on_lost)
+        sock.errorOccurred.connect(self._on_lost)
+        self._socket = sock
+        if info.get("kind") == "unix":
+            sock.connectToServer(str(info.get("address", "")))
+        else:
+            sock.connectToHost(str(info.get("address", "127.0.0.1")), int(info.get("port", 0)))
+
+    def _on_connected(self):
+        self._connected = True
+        self._spawns = 0
+        self._misses = 0
+        self._gave_up = False
+        self._socket.write(ipc_encode({"op": "hello", "token": self._token}))
+
+    def _on_ready_read(self):
+        if self._socket is None:
+            return
+        self._buf += bytes(self._socket.readAll())
+        try:
+            msgs = ipc_decode_frames(self._buf)
+        except ValueError:
+            self._socket.abort()
+            return
+        for msg in msgs:
+            ev = msg.get("ev") if isinstance(msg, dict) else None
+            if ev in ("status", "error", "eventsub_warning", "eventsub_ready", "channel_ready", "trace_dumped"):
+                getattr(self, ev).emit(*msg.get("args", []))
+
+    def _on_lost(self, *args):
+        sock = self._socket
+        if sock is None:
+            return
+        self._socket = None
+        self._buf.clear()
+        sock.deleteLater()
+        if self._connected:
+            self._connected = False
+            self.detached.emit()
+        else:
+            # Nothing answered at the advertised address: stale info file from a dead instance.
+            self._bot_missing()
 
 
 class SettingsDialog(QDialog):
@@ -566,12 +1775,15 @@ class SettingsDialog(QDialog):
 
     def _save(self):
         ch = (self.channel_edit.text() or "").strip().lower().replace("#", "").strip() or None
-        ok = save_config({
+        # Keep keys that are only set by hand in config.json (e.g. EventSub transport options).
+        cfg = load_config()
+        cfg.update({
             "access_token": self.access_edit.text().strip(),
             "refresh_token": self.refresh_edit.text().strip(),
             "client_id": self.client_edit.text().strip(),
             "channel": ch or "",
         })
+        ok = save_config(cfg)
         if not ok:
             QMessageBox.critical(self, "Error", "Could not save config. Check folder permissions.")
             return
@@ -646,6 +1858,7 @@ class MainWindow(QMainWindow):
         credit.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(credit)
         layout.addStretch()
+        QShortcut(QKeySequence("Ctrl+Shift+T"), self, activated=self._dump_traces)
         self.bot_runner = None
         self._start_bot_from_config()
         cfg = load_config()
@@ -654,31 +1867,39 @@ class MainWindow(QMainWindow):
 
     def _open_settings(self):
         dlg = SettingsDialog(self)
-        dlg.exec()
-        self._start_bot_from_config()
+        saved = dlg.exec() == QDialog.DialogCode.Accepted
+        self._start_bot_from_config(reload=saved)
 
     def _send_test_message(self):
         if self.bot_runner and self.bot_runner.isRunning():
-            self.bot_runner.send_to_chat("BabsBot here. I'll call out follows, raids, subs and redemptions.")
+            self.bot_runner.send_to_chat(WELCOME_MESSAGE)
             self.status_label.setText("Sent!")
             QTimer.singleShot(2500, lambda: self.status_label.setText("Running"))
         else:
             QMessageBox.information(self, "Babs", "Bot not connected. Add a token in Settings (gear) and restart.")
 
-    def _start_bot_from_config(self):
+    def _start_bot_from_config(self, reload=False):
+        cfg = load_config()
+        mode = (cfg.get("bot_process") or "thread").strip().lower()
+        if mode not in BOT_PROCESS_MODES:
+            mode = "thread"
+        if isinstance(self.bot_runner, BotClient):
+            # A separate bot process outlives Settings changes; ask it to pick up the new config.
+            if reload and self.bot_runner.isRunning():
+                self.bot_runner.reload_config()
+            return
         if self.bot_runner and self.bot_runner.isRunning():
             return
-        cfg = load_config()
         token = (cfg.get("access_token") or "").strip()
-        if not token:
+        if not token and mode != "attach":
             self.status_label.setText("No token")
             return
-        self.bot_runner = BotRunner(
-            cfg.get("access_token"),
-            cfg.get("refresh_token"),
-            cfg.get("client_id"),
-            cfg.get("channel"),
-        )
+        if mode == "thread":
+            self.bot_runner = BotRunner(**_bot_options(cfg))
+        else:
+            self.bot_runner = BotClient(spawn=(mode == "child"), parent=self)
+            self.bot_runner.detached.connect(self._on_bot_detached)
+            self.bot_runner.trace_dumped.connect(self._on_traces_dumped)
         self.bot_runner.status.connect(self._on_bot_status)
         self.bot_runner.error.connect(self._on_bot_error)
         self.bot_runner.eventsub_warning.connect(self._on_eventsub_warning)
@@ -687,6 +1908,22 @@ class MainWindow(QMainWindow):
         self.bot_runner.start()
         self.status_label.setText("Connecting…")
 
+    def _on_bot_detached(self):
+        self.status_label.setText("Connecting…")
+
+    def _dump_traces(self):
+        # With a separate bot process the traces live there; it replies with trace_dumped.
+        if isinstance(self.bot_runner, BotClient) and self.bot_runner.isRunning():
+            self.bot_runner.dump_traces()
+            return
+        self._on_traces_dumped(dump_event_traces())
+
+    def _on_traces_dumped(self, path):
+        if path:
+            QMessageBox.information(self, "BabsBot", "Event trace written to:\n\n" + path)
+        else:
+            QMessageBox.warning(self, "BabsBot", "Could not write the event trace. Check folder permissions.")
+
     def _on_bot_status(self, text):
         self.status_label.setText("Running")
 
@@ -722,8 +1959,17 @@ class MainWindow(QMainWindow):
 
 
 def main():
+    if "--headless" in sys.argv:
+        sys.exit(run_headless())
+    setup_logging()
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *args: dump_event_traces())
+        # Python only runs signal handlers between bytecodes; tick so they fire while Qt's loop is idle.
+        signal_tick = QTimer()
+        signal_tick.timeout.connect(lambda: None)
+        signal_tick.start(500)
     icon_path = Path(getattr(sys, "_MEIPASS", _app_dir())) / "icon.ico"
     if not icon_path.exists():
         icon_path = _app_dir() / "icon.ico"